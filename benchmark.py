@@ -0,0 +1,341 @@
+"""
+顾问热点函数的微基准测试：使用固定随机种子生成的合成产品库和对话历史，
+结果可保存为JSON基线，并在对比模式下发现超过阈值的性能回退
+
+在项目根目录运行：
+    python benchmark.py --save benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json --threshold 20
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# 基准测试不调用大模型，不需要真实的API密钥
+os.environ.setdefault("ZHIPUAI_API_KEY", "benchmark")
+
+import chatbot
+from parallel_scoring import CatalogScorer
+from stock_analysis import calculate_gain
+
+CATALOG_SIZES = [100, 10_000, 1_000_000]
+HISTORY_SIZES = [10, 100, 1_000]
+TICKER_SIZES = [100, 10_000]
+# 生成超过该规模的Excel文件过慢，load_products只测试较小的产品库
+MAX_EXCEL_SIZE = 10_000
+
+STRATEGIES = ['固定收益类', '债券型', '固收+', '偏股型', '指数增强']
+RISK_LEVELS = ['R1', 'R2', 'R3', 'R4', 'R5']
+PERIODS = ['1天', '7天', '30天', '90天', '180天', '365天', '730天', '6月', '12月', '1年']
+MIN_INVESTMENTS = ['0.01元', '1元', '10元', '1000元', '10000元', '200000元', '1000000元']
+REDEMPTION_FEES = [None, '持有不足1年，赎回费0.1%', '7天以下1.5%，7天-30天0.2%']
+ADVANTAGES = [
+    '历史日日正收益', '灵活稳健，赎回最快下个工作日到账', '国有大行管理人，风控严谨',
+    '流动性极佳，日日开放', '中长债基金，盈利能力强', '布局股债双市机遇',
+    '超强爆发力，擅长新能源行业研究', '对标中证1000，牛市增强，熊市托底', '摊余成本法，稳稳吃票息'
+]
+
+USER_UTTERANCES = [
+    '推荐一个理财产品', '我有10万元', '大概50000元', '预期收益5%以上', '希望稳健一点',
+    '投资期限一年', '半年左右', '3个月', '换一个', '有没有抗通胀的稳健产品？', '这个产品怎么样？'
+]
+ASSISTANT_UTTERANCES = [
+    '为了给您推荐最合适的产品，请告诉我：\n\n1. 您计划投资的金额是多少？\n2. 您的预期收益率是？\n3. 您的投资时间是？',
+    '您的预期收益率是？', '您的投资时间是？', '根据您的需求，我为您推荐以下产品：', '请问您具体对哪方面不满意？'
+]
+
+
+def generate_catalog(size, seed=42):
+    """
+    生成与products.xlsx字段和格式一致的合成产品库
+    """
+    rng = np.random.default_rng(seed)
+    advantage_ids = rng.integers(0, len(ADVANTAGES), size=(size, 2))
+    return pd.DataFrame({
+        '产品名称': [f'合成理财产品{i}号' for i in range(size)],
+        '产品策略': rng.choice(STRATEGIES, size),
+        '风险级别': rng.choice(RISK_LEVELS, size),
+        '封闭期': rng.choice(PERIODS, size),
+        '历史年化收益': np.round(rng.uniform(0.01, 0.15, size), 4),
+        '起投金额': rng.choice(MIN_INVESTMENTS, size),
+        '赎回费': [REDEMPTION_FEES[i] for i in rng.integers(0, len(REDEMPTION_FEES), size)],
+        '产品优势': [f'1.{ADVANTAGES[a]}；2.{ADVANTAGES[b]}' for a, b in advantage_ids],
+    })
+
+
+def generate_history(size, seed=42):
+    """
+    生成用户与顾问交替发言的合成对话历史
+    """
+    rng = np.random.default_rng(seed)
+    messages = []
+    for i in range(size):
+        if i % 2 == 0:
+            messages.append({"role": "user", "content": USER_UTTERANCES[rng.integers(len(USER_UTTERANCES))]})
+        else:
+            messages.append({"role": "assistant", "content": ASSISTANT_UTTERANCES[rng.integers(len(ASSISTANT_UTTERANCES))]})
+    return messages
+
+
+def generate_price_history(days, seed=42):
+    """
+    生成随机游走的收盘价序列，格式与yfinance的history一致
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0.0005, 0.02, days))
+    return pd.DataFrame({'Close': close}, index=pd.date_range('2024-01-01', periods=days, freq='B'))
+
+
+@contextlib.contextmanager
+def working_directory(path):
+    """
+    临时切换工作目录
+    """
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def use_catalog(df):
+    """
+    替换顾问使用的产品库及对应的打分器
+
+    固定使用单进程打分，使基准结果不随机器核数变化；多进程分片打分由 --scaling 单独测试
+    """
+    chatbot.products_df = df
+    chatbot.product_scorer = CatalogScorer(df, workers=1)
+
+
+def bench_find_matching_products(size, seed):
+    use_catalog(generate_catalog(size, seed))
+    return lambda: chatbot.find_matching_products("10万", "5", "12月")
+
+
+def bench_extract_investment_info(size, seed):
+    messages = generate_history(size, seed)
+    return lambda: chatbot.extract_investment_info(messages)
+
+
+def bench_format_recommendation(size, seed):
+    catalog = generate_catalog(size, seed)
+    products = [{"product": catalog.iloc[i], "score": 90.0 - i} for i in range(size)]
+    return lambda: chatbot.format_recommendation(products)
+
+
+def bench_load_products(size, seed):
+    directory = tempfile.TemporaryDirectory()
+    generate_catalog(size, seed).to_excel(os.path.join(directory.name, 'products.xlsx'), index=False)
+
+    def run():
+        # 持有临时目录的引用，保证测试期间文件存在
+        with working_directory(directory.name):
+            chatbot.load_products.clear()
+            chatbot.load_products()
+    return run
+
+
+def bench_calculate_gain(size, seed):
+    histories = [generate_price_history(250, seed + i) for i in range(size)]
+    return lambda: [calculate_gain(hist) for hist in histories]
+
+
+# 基准名称 -> (规模列表, 准备函数)；准备函数返回被计时的无参函数
+BENCHMARKS = {
+    "find_matching_products": (CATALOG_SIZES, bench_find_matching_products),
+    "extract_investment_info": (HISTORY_SIZES, bench_extract_investment_info),
+    "format_recommendation": ([2], bench_format_recommendation),
+    "load_products": ([s for s in CATALOG_SIZES if s <= MAX_EXCEL_SIZE], bench_load_products),
+    "calculate_gain": (TICKER_SIZES, bench_calculate_gain),
+}
+
+
+def time_function(func, repeat, max_time):
+    """
+    预热一次后重复执行并计时，总耗时超过max_time后提前停止（至少执行一次）
+    """
+    func()
+    durations = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run_start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - run_start)
+        if time.perf_counter() - start > max_time:
+            break
+    return {
+        "median": float(np.median(durations)),
+        "min": float(np.min(durations)),
+        "runs": len(durations)
+    }
+
+
+def benchmark_keys(names, catalog_sizes):
+    """
+    返回本次运行应当产生的基准名称及规模[(名称, 规模, 结果键)]
+    """
+    keys = []
+    for name in names:
+        sizes, _ = BENCHMARKS[name]
+        if sizes is CATALOG_SIZES and catalog_sizes:
+            sizes = catalog_sizes
+        keys.extend((name, size, f"{name}[{size}]") for size in sizes)
+    return keys
+
+
+def run_benchmarks(names, catalog_sizes, repeat, max_time, seed):
+    results = {}
+    original_products_df = chatbot.products_df
+    original_product_scorer = chatbot.product_scorer
+    try:
+        for name, size, key in benchmark_keys(names, catalog_sizes):
+            _, setup = BENCHMARKS[name]
+            func = setup(size, seed)
+            print(f"正在测试 {key}...")
+            results[key] = time_function(func, repeat, max_time)
+            # 释放基准替换的打分器占用的进程池和共享内存
+            if chatbot.product_scorer is not original_product_scorer:
+                chatbot.product_scorer.close()
+    finally:
+        chatbot.products_df = original_products_df
+        chatbot.product_scorer = original_product_scorer
+    return results
+
+
+def run_scaling(size, max_workers, max_time, seed):
+    """
+    在同一产品库上分别用1~max_workers个进程打分，每种进程数持续max_time秒，报告吞吐量和加速比
+    """
+    catalog = generate_catalog(size, seed)
+    print(f"\n多进程打分扩展性：产品库规模 {size}")
+    print(f"{'进程数':<8}{'查询/秒':>12}{'加速比':>10}")
+    baseline_throughput = None
+    for workers in range(1, max_workers + 1):
+        # 单进程使用串行向量化打分，多进程强制使用共享内存分片并行
+        scorer = CatalogScorer(catalog, workers=workers, parallel_threshold=0)
+        try:
+            scorer.top_k(100000, 0.05, 360)  # 预热，创建进程池
+            queries = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < max_time:
+                scorer.top_k(100000, 0.05, 360)
+                queries += 1
+            throughput = queries / (time.perf_counter() - start)
+        finally:
+            scorer.close()
+        baseline_throughput = baseline_throughput or throughput
+        print(f"{workers:<8}{throughput:>12.2f}{throughput / baseline_throughput:>10.2f}x")
+
+
+def compare_results(results, baseline, threshold, excluded_keys):
+    """
+    用最小耗时与基线对比，返回回退超过阈值（百分比）或本应运行却缺失的基准名称列表
+
+    最小耗时受系统调度等噪声的影响远小于中位数，适合作为回退判断依据；
+    基线中被 --only / --sizes 有意排除的基准只提示，不算失败
+    """
+    regressions = []
+    print(f"\n{'基准':<40}{'基线最小(ms)':>12}{'当前最小(ms)':>12}{'变化':>10}")
+    for key, result in results.items():
+        current = result["min"] * 1000
+        if key not in baseline:
+            print(f"{key:<40}{'-':>12}{current:>12.3f}{'新增':>10}")
+            continue
+        base = baseline[key]["min"] * 1000
+        change = (current - base) / base * 100 if base > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  ❌ 回退"
+        print(f"{key:<40}{base:>12.3f}{current:>12.3f}{change:>+9.1f}%{flag}")
+
+    for key, result in baseline.items():
+        if key in results:
+            continue
+        base = result["min"] * 1000
+        if key in excluded_keys:
+            print(f"{key:<40}{base:>12.3f}{'-':>12}{'已排除':>10}")
+        else:
+            regressions.append(key)
+            print(f"{key:<40}{base:>12.3f}{'-':>12}{'缺失':>10}  ❌ 未运行")
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{'基准':<40}{'中位数(ms)':>12}{'最小值(ms)':>12}{'次数':>6}")
+    for key, result in results.items():
+        print(f"{key:<40}{result['median'] * 1000:>12.3f}{result['min'] * 1000:>12.3f}{result['runs']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="智能金融产品顾问热点函数微基准测试")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="只运行指定的基准")
+    parser.add_argument("--sizes", nargs="+", type=int, help=f"产品库规模，默认 {CATALOG_SIZES}")
+    parser.add_argument("--repeat", type=int, default=20, help="每个基准的最多执行次数")
+    parser.add_argument("--max-time", type=float, default=30.0, help="每个基准的最长计时时间（秒）")
+    parser.add_argument("--seed", type=int, default=42, help="合成数据的随机种子")
+    parser.add_argument("--save", help="将结果保存为JSON基线")
+    parser.add_argument("--compare", help="与指定的JSON基线对比")
+    parser.add_argument("--threshold", type=float, default=20.0, help="允许的回退百分比，超过则返回非零退出码")
+    parser.add_argument("--scaling", type=int, metavar="SIZE", help="只测试指定规模产品库上多进程打分的扩展性")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="扩展性测试的最大进程数")
+    args = parser.parse_args()
+
+    if args.scaling:
+        run_scaling(args.scaling, args.max_workers, args.max_time, args.seed)
+        return
+
+    # 先读取基线，随机种子不一致时合成数据不同，结果不可比
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        baseline_seed = baseline.get("meta", {}).get("seed")
+        if baseline_seed != args.seed:
+            print(f"基线的随机种子为{baseline_seed}，与当前的{args.seed}不一致，无法对比")
+            sys.exit(2)
+
+    names = args.only or list(BENCHMARKS)
+    results = run_benchmarks(names, args.sizes, args.repeat, args.max_time, args.seed)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "meta": {
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "seed": args.seed,
+                    "sizes": args.sizes or CATALOG_SIZES,
+                    "repeat": args.repeat
+                },
+                "results": results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.save}")
+
+    if args.compare:
+        # 只有 --only / --sizes 有意跳过的已知基准才不算缺失
+        expected_keys = {key for _, _, key in benchmark_keys(names, args.sizes)}
+        excluded_keys = {
+            key for key in baseline["results"]
+            if (args.only or args.sizes) and key not in expected_keys and key.split("[")[0] in BENCHMARKS
+        }
+        regressions = compare_results(results, baseline["results"], args.threshold, excluded_keys)
+        if regressions:
+            print(f"\n{len(regressions)}个基准回退超过{args.threshold:.0f}%或未运行：{', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n所有基准均未回退超过{args.threshold:.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,10 @@ import time
 import threading
 from datetime import datetime, timedelta
 import re  # 添加re模块导入
+import io
+import hashlib
+from product_index import ProductIndex
+from parallel_scoring import CatalogScorer
 
 # 配置日志
 logging.basicConfig(
@@ -28,6 +32,9 @@ load_dotenv()
 # 初始化智谱AI客户端
 client = ZhipuAI(api_key=os.getenv("ZHIPUAI_API_KEY"))
 
+# 推荐产品后等待多久发送关单消息（秒）
+CLOSING_DELAY_SECONDS = 10
+
 # 加载产品数据
 @st.cache_data
 def load_products():
@@ -41,7 +48,11 @@ def load_products():
             logging.error(f"产品数据文件不存在: {file_path}")
             return None
             
-        df = pd.read_excel(file_path)
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        df = pd.read_excel(io.BytesIO(content))
+        # 以文件内容的哈希作为产品库版本，检索索引和打分器按版本缓存
+        df.attrs["catalog_version"] = hashlib.sha256(content).hexdigest()
         st.success(f"成功加载产品数据：共 {len(df)} 条记录")
         return df
     except Exception as e:
@@ -51,6 +62,25 @@ def load_products():
 
 products_df = load_products()
 
+# 构建产品检索索引（产品数据重新加载后会自动重建）
+# 缓存以产品库版本为键：Streamlit对大表只哈希抽样行，不能用产品数据本身作为键
+@st.cache_resource
+def build_product_index(catalog_version, _df):
+    return ProductIndex(_df)
+
+# 构建产品打分器：预先解析数值列，产品库较大时自动使用多进程并行打分
+@st.cache_resource
+def build_product_scorer(catalog_version, _df):
+    return CatalogScorer(_df)
+
+if products_df is not None:
+    catalog_version = products_df.attrs["catalog_version"]
+    product_index = build_product_index(catalog_version, products_df)
+    product_scorer = build_product_scorer(catalog_version, products_df)
+else:
+    product_index = None
+    product_scorer = None
+
 def get_product_info():
     """
     获取产品信息的摘要
@@ -78,7 +108,12 @@ def get_specific_product_info(product_name):
     if len(product) == 0:
         return None
     
-    product = product.iloc[0]
+    return get_product_details(product.iloc[0])
+
+def get_product_details(product):
+    """
+    将产品数据行转换为详细信息字典
+    """
     return {
         "产品名称": product["产品名称"],
         "产品策略": product["产品策略"],
@@ -111,6 +146,38 @@ def is_asking_for_recommendation(query):
     keywords = ["推荐", "介绍", "推荐一个", "推荐一只", "有什么好的", "有哪些"]
     return any(keyword in query for keyword in keywords)
 
+def is_product_question(query):
+    """
+    判断用户是否在咨询产品相关的问题
+    """
+    keywords = ["有没有", "什么", "哪个", "哪款", "哪只", "怎么样", "如何"]
+    return any(keyword in query for keyword in keywords)
+
+def is_answering_investment_questions(user_query, messages):
+    """
+    判断用户是否在回答顾问刚提出的投资金额、收益率、投资时间问题
+    """
+    # 顾问的上一条回复（messages最后一条是当前用户输入）
+    last_reply = ""
+    for msg in reversed(messages[:-1]):
+        if msg["role"] == "assistant":
+            last_reply = msg["content"]
+            break
+    slot_questions = ["您计划投资的金额是多少？", "您的预期收益率是？", "您的投资时间是？"]
+    if not any(question in last_reply for question in slot_questions):
+        return False
+    
+    # 当前输入中包含投资信息才视为回答
+    return any(extract_investment_info([{"role": "user", "content": user_query}]).values())
+
+def search_products(query, top_k=3):
+    """
+    从产品检索索引中查找与问题最相关的产品
+    """
+    if product_index is None:
+        return []
+    return product_index.search(query, top_k=top_k)
+
 def is_user_unsatisfied(query):
     """
     判断用户是否对推荐不满意
@@ -168,54 +235,12 @@ def find_matching_products(investment_amount, expected_return, investment_period
     else:
         days = int(investment_period)
 
-    # 筛选符合条件的产品
-    matching_products = []
-    for _, product in products_df.iterrows():
-        # 跳过已推荐过的产品
-        if product['产品名称'] in exclude_products:
-            continue
-            
-        # 检查起投金额
-        min_investment = float(str(product['起投金额']).replace("元", ""))
-        if amount < min_investment:
-            continue
-        
-        # 检查收益率匹配度
-        if product['历史年化收益'] < expected_return * 0.8:  # 允许20%的收益率差异
-            continue
-        
-        # 检查投资期限
-        product_period = product['封闭期']
-        if isinstance(product_period, str):
-            if "年" in product_period:
-                product_days = int(float(product_period.replace("年", "")) * 365)
-            elif "月" in product_period:
-                product_days = int(float(product_period.replace("月", "")) * 30)
-            else:
-                product_days = int(float(product_period.replace("天", "")))
-        else:
-            product_days = int(product_period)
-        
-        if product_days > days * 1.5:  # 允许50%的期限差异
-            continue
-        
-        # 计算匹配度分数
-        score = 0
-        # 收益率匹配度
-        score += (1 - abs(product['历史年化收益'] - expected_return) / expected_return) * 40
-        # 期限匹配度
-        score += (1 - abs(product_days - days) / days) * 30
-        # 起投金额匹配度
-        score += (1 - (min_investment / amount if amount > min_investment else amount / min_investment)) * 30
-        
-        matching_products.append({
-            "product": product,
-            "score": score
-        })
-    
-    # 按匹配度排序
-    matching_products.sort(key=lambda x: x["score"], reverse=True)
-    return matching_products[:2]  # 返回最匹配的两个产品
+    # 筛选符合条件的产品并按匹配度排序，返回最匹配的两个产品
+    matches = product_scorer.top_k(amount, expected_return, days, k=2, exclude=exclude_products)
+    return [
+        {"product": products_df.iloc[index], "score": score}
+        for index, score in matches
+    ]
 
 def extract_investment_info(messages):
     """
@@ -414,10 +439,12 @@ def format_recommendation(products):
     result += "\n⚠️ 风险提示：历史收益不代表未来收益，投资需谨慎。建议您仔细阅读产品说明书，充分了解产品特点和风险。"
     return result
 
-def get_ai_response(messages):
+def get_ai_response(messages, state=None):
     """
     获取AI的回复
     """
+    if state is None:
+        state = st.session_state
     try:
         # 在用户问题前添加产品信息和指导语
         if len(messages) > 0 and messages[-1]["role"] == "user":
@@ -425,7 +452,7 @@ def get_ai_response(messages):
             
             # 检查是否是表达不满意
             if is_user_unsatisfied(user_query):
-                if st.session_state.last_recommendation:
+                if state.last_recommendation:
                     # 构建系统提示，引导AI询问具体不满意的地方
                     system_prompt = """你是一个专业的金融产品顾问。用户对推荐的产品表示不满意。
 请详细询问用户具体不满意的地方，可以从以下几个方面引导用户表达：
@@ -476,20 +503,41 @@ def get_ai_response(messages):
 1. 您计划投资的金额是多少？
 2. 您的预期收益率是？
 3. 您的投资时间是？"""
+            elif (
+                is_product_question(user_query)
+                and not is_answering_investment_questions(user_query, messages)
+                and (related_products := search_products(user_query))
+            ):
+                # 将检索到的相关产品注入提示词，让回答基于具体产品
+                related_details = "\n\n".join(
+                    format_product_details(get_product_details(item["product"]))
+                    for item in related_products
+                )
+                system_prompt = f"""你是一个专业的金融产品顾问。{product_info}
+与用户问题最相关的产品如下：
+
+{related_details}
+
+请根据这些产品信息回答用户的问题。请注意：
+1. 优先推荐与问题最相关的产品，并说明理由
+2. 说明风险等级和适合的投资者类型
+3. 不要编造以上信息中没有的产品
+4. 提醒用户历史收益不代表未来收益
+"""
             else:
                 # 从对话历史中提取投资信息
                 investment_info = extract_investment_info(messages)
                 
                 # 如果有上一次推荐记录，并且用户提供了新的反馈
-                if st.session_state.last_recommendation and len(messages) >= 2:
+                if state.last_recommendation and len(messages) >= 2:
                     # 更新投资信息
                     updated_info = update_investment_info(
-                        st.session_state.last_recommendation["investment_info"],
+                        state.last_recommendation["investment_info"],
                         user_query
                     )
                     
                     # 获取已推荐过的产品
-                    exclude_products = st.session_state.recommended_products
+                    exclude_products = state.recommended_products
                     
                     # 查找新的匹配产品
                     matching_products = find_matching_products(
@@ -504,12 +552,12 @@ def get_ai_response(messages):
                         exclude_products.add(item["product"]["产品名称"])
                     
                     # 保存当前推荐的产品和投资信息到会话状态
-                    st.session_state.last_recommendation = {
+                    state.last_recommendation = {
                         "products": matching_products,
                         "investment_info": updated_info,
                         "timestamp": time.time()
                     }
-                    st.session_state.recommended_products = exclude_products
+                    state.recommended_products = exclude_products
                     
                     return format_recommendation(matching_products)
                 
@@ -520,15 +568,15 @@ def get_ai_response(messages):
                         investment_info["金额"],
                         investment_info["收益"],
                         investment_info["时间"],
-                        st.session_state.recommended_products
+                        state.recommended_products
                     )
                     
                     # 更新已推荐产品集合
                     for item in matching_products:
-                        st.session_state.recommended_products.add(item["product"]["产品名称"])
+                        state.recommended_products.add(item["product"]["产品名称"])
                     
                     # 保存当前推荐的产品和投资信息到会话状态
-                    st.session_state.last_recommendation = {
+                    state.last_recommendation = {
                         "products": matching_products,
                         "investment_info": investment_info,
                         "timestamp": time.time()
@@ -558,66 +606,25 @@ def get_ai_response(messages):
         logging.error(f"调用智谱AI API时发生错误: {str(e)}")
         return "抱歉，我现在遇到了一些问题，请稍后再试。"
 
-# 设置页面标题
-st.title("智能金融产品顾问 🤖")
-st.caption("Powered by 智谱AI GLM-4")
-
-# 初始化会话状态
-if "messages" not in st.session_state:
-    st.session_state.messages = []
-if "last_recommendation" not in st.session_state:
-    st.session_state.last_recommendation = None
-if "last_closing_time" not in st.session_state:
-    st.session_state.last_closing_time = None
-if "recommended_products" not in st.session_state:
-    st.session_state.recommended_products = set()  # 用于存储已推荐过的产品名称
-
-# 显示产品统计信息
-if products_df is not None:
-    with st.expander("查看产品概况"):
-        st.write(get_product_info())
-        st.write("\n### 所有产品列表：")
-        st.write(f"产品数据形状: {products_df.shape}")
-        st.write(f"产品数据列: {list(products_df.columns)}")
-        for name in products_df['产品名称']:
-            st.write(f"- {name}")
-else:
-    st.error("无法加载产品数据，请检查products.xlsx文件是否存在且格式正确。")
-
-# 显示聊天历史
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
-
-# 用户输入
-if prompt := st.chat_input("请描述您的投资需求..."):
-    # 添加用户消息
-    st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    # 显示AI思考中的状态
-    with st.chat_message("assistant"):
-        with st.spinner("思考中..."):
-            try:
-                # 获取AI回复
-                messages = [
-                    {"role": m["role"], "content": m["content"]}
-                    for m in st.session_state.messages
-                ]
-                
-                # 检查是否是对之前推荐的不满意表达
-                if is_user_unsatisfied(prompt):
-                    # 查找最近的推荐消息
-                    last_recommendation = None
-                    for i in range(len(st.session_state.messages)-2, -1, -1):
-                        if "推荐" in st.session_state.messages[i]["content"] and st.session_state.messages[i]["role"] == "assistant":
-                            last_recommendation = st.session_state.messages[i]["content"]
-                            break
-                    
-                    if last_recommendation:
-                        # 构建系统提示，引导AI询问具体不满意的地方
-                        system_prompt = f"""你是一个专业的金融产品顾问。用户对以下推荐的产品表示不满意：
+def get_turn_response(prompt, messages, state=None):
+    """
+    处理一轮用户输入，返回AI的回复
+    """
+    if state is None:
+        state = st.session_state
+
+    # 检查是否是对之前推荐的不满意表达
+    if is_user_unsatisfied(prompt):
+        # 查找最近的推荐消息
+        last_recommendation = None
+        for i in range(len(state.messages)-2, -1, -1):
+            if "推荐" in state.messages[i]["content"] and state.messages[i]["role"] == "assistant":
+                last_recommendation = state.messages[i]["content"]
+                break
+        
+        if last_recommendation:
+            # 构建系统提示，引导AI询问具体不满意的地方
+            system_prompt = f"""你是一个专业的金融产品顾问。用户对以下推荐的产品表示不满意：
 
 {last_recommendation}
 
@@ -629,41 +636,102 @@ if prompt := st.chat_input("请描述您的投资需求..."):
 5. 是产品策略不符合预期？
 
 请根据用户的具体反馈，帮助我们找到更合适的产品。"""
-                        
-                        messages = [{"role": "system", "content": system_prompt}] + messages[-2:]
-                        response = client.chat.completions.create(
-                            model="glm-4-0520",
-                            messages=messages,
-                            stream=False
-                        )
-                        response = response.choices[0].message.content
-                    else:
-                        response = "抱歉，我没有找到之前的推荐记录。请重新告诉我您的投资需求，我会为您推荐合适的产品。"
-                else:
-                    response = get_ai_response(messages)
+            
+            messages = [{"role": "system", "content": system_prompt}] + messages[-2:]
+            response = client.chat.completions.create(
+                model="glm-4-0520",
+                messages=messages,
+                stream=False
+            )
+            return response.choices[0].message.content
+        else:
+            return "抱歉，我没有找到之前的推荐记录。请重新告诉我您的投资需求，我会为您推荐合适的产品。"
+
+    return get_ai_response(messages, state)
+
+def get_closing_message(messages, state=None):
+    """
+    推荐产品后生成关单消息
+    """
+    if state is None:
+        state = st.session_state
+
+    # 从对话历史中提取投资信息
+    investment_info = extract_investment_info(messages)
+    
+    return generate_closing_message(
+        state.last_recommendation["products"] if state.last_recommendation else None,
+        investment_info
+    )
+
+# 页面逻辑只在通过 streamlit run 启动时执行，便于其他脚本直接导入上面的顾问逻辑
+if __name__ == "__main__":
+    # 设置页面标题
+    st.title("智能金融产品顾问 🤖")
+    st.caption("Powered by 智谱AI GLM-4")
+
+    # 初始化会话状态
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+    if "last_recommendation" not in st.session_state:
+        st.session_state.last_recommendation = None
+    if "last_closing_time" not in st.session_state:
+        st.session_state.last_closing_time = None
+    if "recommended_products" not in st.session_state:
+        st.session_state.recommended_products = set()  # 用于存储已推荐过的产品名称
+
+    # 显示产品统计信息
+    if products_df is not None:
+        with st.expander("查看产品概况"):
+            st.write(get_product_info())
+            st.write("\n### 所有产品列表：")
+            st.write(f"产品数据形状: {products_df.shape}")
+            st.write(f"产品数据列: {list(products_df.columns)}")
+            for name in products_df['产品名称']:
+                st.write(f"- {name}")
+    else:
+        st.error("无法加载产品数据，请检查products.xlsx文件是否存在且格式正确。")
+
+    # 显示聊天历史
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+    # 用户输入
+    if prompt := st.chat_input("请描述您的投资需求..."):
+        # 添加用户消息
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        # 显示AI思考中的状态
+        with st.chat_message("assistant"):
+            with st.spinner("思考中..."):
+                try:
+                    # 获取AI回复
+                    messages = [
+                        {"role": m["role"], "content": m["content"]}
+                        for m in st.session_state.messages
+                    ]
                 
-                # 添加AI回复到历史记录
-                st.session_state.messages.append({"role": "assistant", "content": response})
-                st.markdown(response)
+                    response = get_turn_response(prompt, messages)
                 
-                # 如果是产品推荐，等待10秒后发送关单消息
-                if "推荐以下产品" in response:
-                    time.sleep(10)
-                    
-                    # 从对话历史中提取投资信息
-                    investment_info = extract_investment_info(messages)
+                    # 添加AI回复到历史记录
+                    st.session_state.messages.append({"role": "assistant", "content": response})
+                    st.markdown(response)
+                
+                    # 如果是产品推荐，等待一段时间后发送关单消息
+                    if "推荐以下产品" in response:
+                        time.sleep(CLOSING_DELAY_SECONDS)
                     
-                    # 发送关单消息
-                    closing_message = generate_closing_message(
-                        st.session_state.last_recommendation["products"] if st.session_state.last_recommendation else None,
-                        investment_info
-                    )
+                        # 发送关单消息
+                        closing_message = get_closing_message(messages)
                     
-                    if closing_message:
-                        st.session_state.messages.append({"role": "assistant", "content": closing_message})
-                        st.session_state.last_closing_time = time.time()
-                        st.rerun()
+                        if closing_message:
+                            st.session_state.messages.append({"role": "assistant", "content": closing_message})
+                            st.session_state.last_closing_time = time.time()
+                            st.rerun()
                     
-            except Exception as e:
-                logging.error(f"处理用户输入时发生错误: {str(e)}")
-                st.error("抱歉，处理您的请求时发生错误，请重试。") 
\ No newline at end of file
+                except Exception as e:
+                    logging.error(f"处理用户输入时发生错误: {str(e)}")
+                    st.error("抱歉，处理您的请求时发生错误，请重试。") 
\ No newline at end of file
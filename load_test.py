@@ -0,0 +1,135 @@
+"""
+并发会话压测：用假的GLM客户端回放多轮对话脚本，统计吞吐量和各路径的延迟分布
+
+在项目根目录运行：
+    python load_test.py --sessions 50 --llm-latency 0.8 --closing-delay 10
+"""
+import os
+import time
+import random
+import argparse
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# 压测使用假客户端，不需要真实的API密钥
+os.environ.setdefault("ZHIPUAI_API_KEY", "load-test")
+
+import chatbot
+
+# 每个会话回放的对话脚本：(路径名称, 用户输入)
+CONVERSATION_SCRIPT = [
+    ("推荐请求", "推荐一个理财产品"),
+    ("投资金额", "我有10万元"),
+    ("预期收益", "预期收益5%以上"),
+    ("投资期限", "投资期限一年"),
+    ("换一个", "换一个"),
+    ("产品咨询", "有没有抗通胀的稳健产品？"),
+]
+
+
+class FakeZhipuAI:
+    """
+    模拟智谱AI客户端：按配置的延迟返回固定回复，所有会话共享一个实例
+    """
+
+    def __init__(self, latency=0.5, jitter=0.2, seed=42):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False):
+        with self.lock:
+            self.calls += 1
+            delay = max(0.0, self.random.gauss(self.latency, self.jitter * self.latency))
+        time.sleep(delay)
+        message = SimpleNamespace(content=f"（模拟{model}回复）已收到您的问题。")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def new_session_state():
+    """
+    创建与Streamlit会话状态字段一致的独立会话状态
+    """
+    return SimpleNamespace(
+        messages=[],
+        last_recommendation=None,
+        last_closing_time=None,
+        recommended_products=set()
+    )
+
+
+def run_session(closing_delay):
+    """
+    回放一个完整会话，返回[(路径名称, 耗时秒)]
+    """
+    state = new_session_state()
+    timings = []
+    for path, prompt in CONVERSATION_SCRIPT:
+        start = time.perf_counter()
+        state.messages.append({"role": "user", "content": prompt})
+        messages = [{"role": m["role"], "content": m["content"]} for m in state.messages]
+        response = chatbot.get_turn_response(prompt, messages, state)
+        state.messages.append({"role": "assistant", "content": response})
+        timings.append((path, time.perf_counter() - start))
+
+        # 与页面逻辑一致：推荐产品后等待一段时间再发送关单消息
+        if "推荐以下产品" in response:
+            start = time.perf_counter()
+            time.sleep(closing_delay)
+            closing_message = chatbot.get_closing_message(messages, state)
+            if closing_message:
+                state.messages.append({"role": "assistant", "content": closing_message})
+                state.last_closing_time = time.time()
+            timings.append(("关单", time.perf_counter() - start))
+    return timings
+
+
+def report(timings, elapsed, sessions, llm_calls):
+    """
+    打印吞吐量和各路径的p50/p95/p99延迟
+    """
+    print(f"\n会话数: {sessions}，总轮次: {len(timings)}，GLM调用次数: {llm_calls}")
+    print(f"总耗时: {elapsed:.2f}秒，吞吐量: {len(timings) / elapsed:.2f} 轮/秒，{sessions / elapsed:.2f} 会话/秒")
+    print(f"\n{'路径':<8}{'次数':>6}{'p50(ms)':>12}{'p95(ms)':>12}{'p99(ms)':>12}")
+    paths = [path for path, _ in CONVERSATION_SCRIPT] + ["关单"]
+    for path in paths:
+        durations = np.array([d for p, d in timings if p == path]) * 1000
+        if len(durations) == 0:
+            continue
+        p50, p95, p99 = np.percentile(durations, [50, 95, 99])
+        print(f"{path:<8}{len(durations):>6}{p50:>12.1f}{p95:>12.1f}{p99:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="智能金融产品顾问并发会话压测")
+    parser.add_argument("--sessions", type=int, default=20, help="并发会话数")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="模拟GLM调用的平均延迟（秒）")
+    parser.add_argument("--llm-jitter", type=float, default=0.2, help="GLM延迟的相对抖动")
+    parser.add_argument("--closing-delay", type=float, default=chatbot.CLOSING_DELAY_SECONDS, help="推荐后发送关单消息前的等待时间（秒）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    if chatbot.products_df is None:
+        print("无法加载产品数据，请在项目根目录运行")
+        return
+
+    chatbot.client = FakeZhipuAI(args.llm_latency, args.llm_jitter, args.seed)
+
+    print(f"开始压测：{args.sessions}个并发会话，每个会话{len(CONVERSATION_SCRIPT)}轮对话...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        results = list(executor.map(run_session, [args.closing_delay] * args.sessions))
+    elapsed = time.perf_counter() - start
+
+    timings = [item for session in results for item in session]
+    report(timings, elapsed, args.sessions, chatbot.client.calls)
+
+
+if __name__ == "__main__":
+    main()
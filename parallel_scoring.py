@@ -0,0 +1,218 @@
+"""
+产品匹配度打分：产品库解析为数值列后向量化打分；产品库较大时自动切换为多进程并行，
+各列按分片放在共享内存中，每次请求只传递分片范围和查询条件，不需要序列化产品数据
+"""
+import os
+import logging
+import threading
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# 产品数超过该阈值时使用多进程并行打分
+PARALLEL_THRESHOLD = 200_000
+
+# 打分用到的数值列
+SCORE_COLUMNS = ('min_investment', 'annual_return', 'period_days')
+
+# 工作进程中挂载的共享内存及对应的数组
+_worker_shms = []
+_worker_columns = {}
+
+
+def parse_catalog(df):
+    """
+    将起投金额、历史年化收益、封闭期解析为数值列（封闭期统一转换为天数）
+    """
+    min_investment = df['起投金额'].astype(str).str.replace("元", "", regex=False).astype(float)
+
+    period = df['封闭期'].astype(str)
+    period_value = period.str.replace(r"[年月天]", "", regex=True).astype(float)
+    factor = np.where(period.str.contains("年"), 365, np.where(period.str.contains("月"), 30, 1))
+    period_days = np.trunc(period_value.to_numpy() * factor)
+
+    return {
+        'min_investment': min_investment.to_numpy(dtype=np.float64),
+        'annual_return': df['历史年化收益'].to_numpy(dtype=np.float64),
+        'period_days': period_days.astype(np.float64),
+    }
+
+
+def score_products(columns, amount, expected_return, days):
+    """
+    计算每个产品的匹配度分数，不符合条件的产品得分为-inf
+    """
+    min_investment = columns['min_investment']
+    annual_return = columns['annual_return']
+    period_days = columns['period_days']
+
+    # 起投金额、收益率（允许20%差异）、投资期限（允许50%差异）
+    eligible = (
+        (amount >= min_investment)
+        & (annual_return >= expected_return * 0.8)
+        & (period_days <= days * 1.5)
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 收益率匹配度
+        score = (1 - np.abs(annual_return - expected_return) / expected_return) * 40
+        # 期限匹配度
+        score = score + (1 - np.abs(period_days - days) / days) * 30
+        # 起投金额匹配度
+        ratio = np.where(amount > min_investment, min_investment / amount, amount / min_investment)
+        score = score + (1 - ratio) * 30
+
+    return np.where(eligible, score, -np.inf)
+
+
+def top_k(scores, k, offset=0):
+    """
+    取得分最高的k个产品，得分相同时按产品顺序排列，返回(行号数组, 分数数组)
+    """
+    valid = np.flatnonzero(scores > -np.inf)
+    if len(valid) > k:
+        # 先找到第k高的分数，保留所有不低于该分数的产品，避免并列时结果不稳定
+        kth = np.partition(scores[valid], len(valid) - k)[len(valid) - k]
+        valid = valid[scores[valid] >= kth]
+    order = np.lexsort((valid, -scores[valid]))[:k]
+    return valid[order] + offset, scores[valid[order]]
+
+
+def _attach_shared_columns(specs):
+    """
+    工作进程初始化：按名称挂载共享内存中的产品列
+    """
+    for column, (shm_name, size) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shms.append(shm)
+        _worker_columns[column] = np.ndarray((size,), dtype=np.float64, buffer=shm.buf)
+
+
+def _score_shard(start, stop, amount, expected_return, days, k):
+    """
+    工作进程中对一个分片打分，返回分片内的top-k
+    """
+    columns = {column: values[start:stop] for column, values in _worker_columns.items()}
+    scores = score_products(columns, amount, expected_return, days)
+    return top_k(scores, k, offset=start)
+
+
+def _release(pool, shms):
+    if pool[0] is not None:
+        pool[0].shutdown(wait=True)
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+class CatalogScorer:
+    """
+    产品库打分器：每个产品库版本构建一次
+
+    产品数低于parallel_threshold或只有一个进程时在当前进程中向量化打分；
+    否则把各列复制到共享内存，按进程数切分为分片，由进程池并行打分后合并各分片的top-k。
+    """
+
+    def __init__(self, df, workers=None, parallel_threshold=PARALLEL_THRESHOLD):
+        self.names = df['产品名称'].to_numpy()
+        # 产品名称 -> 行号数组；同名产品可能有多行，排除时需要全部去掉
+        self.name_rows = df.reset_index(drop=True).groupby('产品名称', sort=False).indices
+        self.size = len(df)
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel = self.workers > 1 and self.size >= parallel_threshold
+        # 当前进程保留一份数值列，串行打分或进程池异常时使用
+        self.columns = parse_catalog(df)
+        columns = self.columns
+
+        if not self.parallel:
+            return
+
+        # 将各列放入共享内存
+        self._shms = []
+        self._specs = {}
+        for column in SCORE_COLUMNS:
+            shm = shared_memory.SharedMemory(create=True, size=max(columns[column].nbytes, 1))
+            np.ndarray((self.size,), dtype=np.float64, buffer=shm.buf)[:] = columns[column]
+            self._shms.append(shm)
+            self._specs[column] = (shm.name, self.size)
+
+        bounds = np.linspace(0, self.size, self.workers + 1, dtype=int)
+        self.shards = [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+        # 进程池在第一次打分时创建；对象回收或程序退出时关闭进程池并释放共享内存
+        self._pool = [None]
+        self._pool_lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, _release, self._pool, self._shms)
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool[0] is None:
+                # 进程池在Streamlit的多线程服务中创建，fork可能继承其他线程持有的锁导致死锁，
+                # 因此使用spawn；工作进程按名称挂载共享内存，不依赖从父进程继承的数据
+                self._pool[0] = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_attach_shared_columns,
+                    initargs=(self._specs,)
+                )
+            return self._pool[0]
+
+    def _reset_pool(self, pool):
+        """
+        丢弃已损坏的进程池，下次打分时重新创建
+        """
+        with self._pool_lock:
+            if self._pool[0] is pool:
+                self._pool[0] = None
+        pool.shutdown(wait=False)
+
+    def top_k(self, amount, expected_return, days, k=2, exclude=None):
+        """
+        返回匹配度最高的k个产品[(行号, 分数)]，排除exclude中的产品名称
+        """
+        exclude = exclude or set()
+        # 多取出被排除产品的行数，保证过滤后仍有k个
+        limit = k + sum(len(self.name_rows.get(name, ())) for name in exclude)
+
+        results = None
+        if self.parallel:
+            pool = self._get_pool()
+            try:
+                futures = [
+                    pool.submit(_score_shard, start, stop, amount, expected_return, days, limit)
+                    for start, stop in self.shards
+                ]
+                results = [future.result() for future in futures]
+            except BrokenProcessPool as e:
+                # 工作进程异常退出：重置进程池，本次改为在当前进程中打分
+                logging.error(f"打分进程池异常，改为串行打分: {str(e)}")
+                self._reset_pool(pool)
+
+        if results is not None:
+            indices = np.concatenate([indices for indices, _ in results])
+            scores = np.concatenate([scores for _, scores in results])
+            order = np.lexsort((indices, -scores))
+            indices, scores = indices[order], scores[order]
+        else:
+            scores = score_products(self.columns, amount, expected_return, days)
+            indices, scores = top_k(scores, limit)
+
+        matches = []
+        for index, score in zip(indices, scores):
+            if self.names[index] in exclude:
+                continue
+            matches.append((int(index), float(score)))
+            if len(matches) == k:
+                break
+        return matches
+
+    def close(self):
+        """
+        关闭进程池并释放共享内存
+        """
+        if self.parallel:
+            self._finalizer()
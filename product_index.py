@@ -0,0 +1,116 @@
+"""
+产品检索索引：对产品名称、产品策略、产品优势建立字符n-gram BM25索引，完全离线运行
+"""
+import re
+import numpy as np
+from scipy import sparse
+
+# 参与检索的字段
+INDEX_FIELDS = ['产品名称', '产品策略', '产品优势']
+
+# 提问中常见但不指向具体产品的词语，查询前去掉
+QUERY_STOPWORDS = [
+    '有没有', '有哪些', '是什么', '什么', '怎么样', '怎么', '如何', '哪个', '哪款', '哪只',
+    '这个', '那个', '这款', '那款', '产品', '理财', '推荐', '一下', '可以', '适合', '我想', '请问'
+]
+
+
+def char_ngrams(text, ngram_range=(2, 3)):
+    """
+    将文本切分为字符n-gram（中文无需分词，标点和空白作为分隔）
+
+    单字几乎出现在每个产品中，默认只使用二元和三元n-gram
+    """
+    min_n, max_n = ngram_range
+    grams = []
+    for segment in re.split(r'[\W_]+', str(text).lower()):
+        for n in range(min_n, max_n + 1):
+            for i in range(len(segment) - n + 1):
+                grams.append(segment[i:i + n])
+    return grams
+
+
+class ProductIndex:
+    """
+    基于字符n-gram的BM25产品检索索引
+
+    构建时把每个产品的BM25词项权重存为稀疏矩阵（产品 x n-gram），
+    查询时只需取出查询中出现的n-gram列求和，即可得到每个产品的得分。
+    """
+
+    def __init__(self, df, fields=INDEX_FIELDS, ngram_range=(2, 3), k1=1.5, b=0.75):
+        self.df = df.reset_index(drop=True)
+        self.ngram_range = ngram_range
+        self.vocabulary = {}
+
+        # 统计每个产品的n-gram词频
+        rows, cols, counts = [], [], []
+        doc_lengths = np.zeros(len(self.df))
+        for doc_id, text in enumerate(self._documents(fields)):
+            grams = char_ngrams(text, ngram_range)
+            doc_lengths[doc_id] = len(grams)
+            term_counts = {}
+            for gram in grams:
+                term_id = self.vocabulary.setdefault(gram, len(self.vocabulary))
+                term_counts[term_id] = term_counts.get(term_id, 0) + 1
+            rows.extend([doc_id] * len(term_counts))
+            cols.extend(term_counts.keys())
+            counts.extend(term_counts.values())
+
+        tf = sparse.csr_matrix(
+            (np.asarray(counts, dtype=np.float64), (rows, cols)),
+            shape=(len(self.df), len(self.vocabulary))
+        )
+
+        # 计算BM25权重：idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        doc_freq = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log(1 + (len(self.df) - doc_freq + 0.5) / (doc_freq + 0.5))
+        avg_length = doc_lengths.mean() if len(doc_lengths) > 0 else 0.0
+        norm = k1 * (1 - b + b * doc_lengths / avg_length) if avg_length > 0 else np.full(len(doc_lengths), k1)
+        weights = tf.copy()
+        row_norm = np.repeat(norm, np.diff(tf.indptr))
+        weights.data = idf[tf.indices] * tf.data * (k1 + 1) / (tf.data + row_norm)
+
+        # 按列存储，查询时按n-gram取列
+        self.weights = weights.tocsc()
+
+    def _documents(self, fields):
+        """
+        拼接每个产品的检索字段
+        """
+        columns = [self.df[field].fillna('').astype(str) for field in fields if field in self.df.columns]
+        if not columns:
+            return [''] * len(self.df)
+        text = columns[0]
+        for column in columns[1:]:
+            text = text + ' ' + column
+        return text.tolist()
+
+    def search(self, query, top_k=3, min_score=1.0):
+        """
+        检索与查询最相关的产品，返回[{"product": 产品行, "score": 得分}]，按得分降序
+
+        查询去掉泛指词后没有得分高于min_score的产品时返回空列表
+        """
+        for stopword in QUERY_STOPWORDS:
+            query = query.replace(stopword, ' ')
+
+        term_ids = {}
+        for gram in char_ngrams(query, self.ngram_range):
+            term_id = self.vocabulary.get(gram)
+            if term_id is not None:
+                term_ids[term_id] = term_ids.get(term_id, 0) + 1
+        if not term_ids or len(self.df) == 0:
+            return []
+
+        query_vector = np.fromiter(term_ids.values(), dtype=np.float64)
+        scores = self.weights[:, list(term_ids.keys())] @ query_vector
+
+        top_k = min(top_k, len(scores))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [
+            {"product": self.df.iloc[i], "score": float(scores[i])}
+            for i in candidates
+            if scores[i] > min_score
+        ]
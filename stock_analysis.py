@@ -1,9 +1,18 @@
-import yfinance as yf
 import pandas as pd
 from datetime import datetime
-from tqdm import tqdm  # 添加进度条
+
+def calculate_gain(hist):
+    # 根据区间首尾收盘价计算涨幅（%）
+    initial_price = hist.iloc[0]['Close']
+    current_price = hist.iloc[-1]['Close']
+    gain = ((current_price - initial_price) / initial_price) * 100
+    return gain, initial_price, current_price
 
 def get_top_performers(start_date='2024-01-01', top_n=10):
+    # yfinance和tqdm只在获取行情时需要，calculate_gain不依赖它们
+    import yfinance as yf
+    from tqdm import tqdm  # 添加进度条
+
     # 获取纳斯达克100的成分股（作为示例）
     print("正在获取纳斯达克100成分股列表...")
     nasdaq100 = pd.read_html('https://en.wikipedia.org/wiki/Nasdaq-100')[4]
@@ -17,9 +26,7 @@ def get_top_performers(start_date='2024-01-01', top_n=10):
             hist = stock.history(start=start_date)
             
             if len(hist) > 0:
-                initial_price = hist.iloc[0]['Close']
-                current_price = hist.iloc[-1]['Close']
-                gain = ((current_price - initial_price) / initial_price) * 100
+                gain, initial_price, current_price = calculate_gain(hist)
                 
                 results.append({
                     'Ticker': ticker,
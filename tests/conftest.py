@@ -0,0 +1,10 @@
+import os
+import sys
+
+# 测试直接导入项目根目录下的脚本；chatbot 读取相对路径的 products.xlsx
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# 测试使用假的GLM客户端，不需要真实的API密钥
+os.environ.setdefault("ZHIPUAI_API_KEY", "test")
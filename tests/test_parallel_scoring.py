@@ -0,0 +1,118 @@
+import random
+
+import pandas as pd
+import pytest
+
+import chatbot
+from benchmark import generate_catalog
+from parallel_scoring import CatalogScorer
+
+
+def reference_matching_products(products_df, amount, expected_return, days, exclude_products):
+    """
+    改为向量化打分之前逐行打分的实现，用于校验结果一致
+    """
+    matching_products = []
+    for _, product in products_df.iterrows():
+        if product['产品名称'] in exclude_products:
+            continue
+        min_investment = float(str(product['起投金额']).replace("元", ""))
+        if amount < min_investment:
+            continue
+        if product['历史年化收益'] < expected_return * 0.8:
+            continue
+        product_period = product['封闭期']
+        if isinstance(product_period, str):
+            if "年" in product_period:
+                product_days = int(float(product_period.replace("年", "")) * 365)
+            elif "月" in product_period:
+                product_days = int(float(product_period.replace("月", "")) * 30)
+            else:
+                product_days = int(float(product_period.replace("天", "")))
+        else:
+            product_days = int(product_period)
+        if product_days > days * 1.5:
+            continue
+        score = 0
+        score += (1 - abs(product['历史年化收益'] - expected_return) / expected_return) * 40
+        score += (1 - abs(product_days - days) / days) * 30
+        score += (1 - (min_investment / amount if amount > min_investment else amount / min_investment)) * 30
+        matching_products.append({"product": product, "score": score})
+    matching_products.sort(key=lambda x: x["score"], reverse=True)
+    return [(product["product"].name, product["score"]) for product in matching_products[:2]]
+
+
+def random_queries(df, count, seed):
+    rng = random.Random(seed)
+    names = list(df['产品名称'])
+    for _ in range(count):
+        exclude = set(rng.sample(names, min(3, len(names)))) if rng.random() < 0.5 else set()
+        yield (
+            rng.choice([100000, 5000, 1000000, 500000, 5000]),
+            rng.choice([0.03, 0.05, 0.08, 0.025]),
+            rng.choice([360, 180, 365, 30, 730]),
+            exclude
+        )
+
+
+def duplicated_catalog():
+    # 第一个产品重复一行，排除该名称时需要去掉两行
+    df = chatbot.products_df
+    return pd.concat([df.iloc[[0]], df], ignore_index=True)
+
+
+@pytest.mark.parametrize("df", [
+    chatbot.products_df,
+    duplicated_catalog(),
+    generate_catalog(2000, seed=7),
+], ids=["products", "duplicated", "synthetic"])
+@pytest.mark.parametrize("workers", [1, 3])
+def test_matches_reference_implementation(df, workers):
+    scorer = CatalogScorer(df, workers=workers, parallel_threshold=0)
+    try:
+        assert scorer.parallel == (workers > 1)
+        for amount, expected_return, days, exclude in random_queries(df, 20, seed=workers):
+            expected = reference_matching_products(df, amount, expected_return, days, exclude)
+            assert scorer.top_k(amount, expected_return, days, k=2, exclude=exclude) == expected
+    finally:
+        scorer.close()
+
+
+def test_excluding_duplicated_name_keeps_k_results():
+    df = duplicated_catalog()
+    name = df.iloc[0]['产品名称']
+    scorer = CatalogScorer(df)
+    assert len(scorer.top_k(100000, 0.02, 365, k=2, exclude={name})) == 2
+    assert len(reference_matching_products(df, 100000, 0.02, 365, {name})) == 2
+
+
+def test_recovers_from_broken_pool():
+    df = generate_catalog(2000, seed=11)
+    scorer = CatalogScorer(df, workers=2, parallel_threshold=0)
+    try:
+        expected = scorer.top_k(100000, 0.05, 360)
+        pool = scorer._pool[0]
+        # 杀掉一个工作进程，模拟工作进程异常退出
+        process = next(iter(pool._processes.values()))
+        process.kill()
+        process.join()
+        assert scorer.top_k(100000, 0.05, 360) == expected
+        assert scorer.top_k(100000, 0.05, 360) == expected
+        assert scorer._pool[0] is not pool
+    finally:
+        scorer.close()
+
+
+def test_catalog_version_follows_file_content(tmp_path, monkeypatch):
+    # 检索索引和打分器以 catalog_version 为缓存键，同样行数的产品库内容变化时版本也必须变化
+    monkeypatch.chdir(tmp_path)
+
+    def load_version():
+        chatbot.load_products.clear()
+        return chatbot.load_products().attrs["catalog_version"]
+
+    generate_catalog(50, seed=1).to_excel("products.xlsx", index=False)
+    first = load_version()
+    assert load_version() == first
+    generate_catalog(50, seed=2).to_excel("products.xlsx", index=False)
+    assert load_version() != first
@@ -0,0 +1,93 @@
+import pytest
+
+import chatbot
+from load_test import FakeZhipuAI, new_session_state
+from product_index import ProductIndex
+
+
+class RecordingZhipuAI(FakeZhipuAI):
+    """
+    记录每次调用传给模型的消息
+    """
+
+    def __init__(self):
+        super().__init__(latency=0, jitter=0)
+        self.requests = []
+
+    def create(self, model, messages, stream=False):
+        self.requests.append(messages)
+        return super().create(model, messages, stream)
+
+
+@pytest.fixture(autouse=True)
+def fake_client(monkeypatch):
+    client = RecordingZhipuAI()
+    monkeypatch.setattr(chatbot, "client", client)
+    return client
+
+
+def replay(turns):
+    state = new_session_state()
+    responses = []
+    for prompt in turns:
+        state.messages.append({"role": "user", "content": prompt})
+        messages = [dict(m) for m in state.messages]
+        response = chatbot.get_turn_response(prompt, messages, state)
+        state.messages.append({"role": "assistant", "content": response})
+        responses.append(response)
+    return responses
+
+
+def test_search_finds_specific_product():
+    index = ProductIndex(chatbot.products_df)
+    hits = index.search("有没有新能源主题的产品？")
+    assert hits[0]["product"]["产品名称"] == "鹏华碳中和主题混合A"
+
+
+def test_search_ignores_vague_question():
+    index = ProductIndex(chatbot.products_df)
+    assert index.search("这个产品怎么样？") == []
+
+
+@pytest.mark.parametrize("question", [
+    "有没有抗通胀的稳健产品？",
+    "有没有一年期的稳健产品？",
+])
+def test_product_question_gets_retrieval_grounded_prompt(fake_client, question):
+    responses = replay([question])
+    assert responses[0].startswith("（模拟")
+    system_prompt = fake_client.requests[-1][0]["content"]
+    assert "与用户问题最相关的产品如下" in system_prompt
+
+
+def test_product_question_with_slot_words_reaches_index(monkeypatch):
+    # 收益率只在数值列中，检索不到具体产品时继续走推荐流程
+    queries = []
+    search_products = chatbot.search_products
+    monkeypatch.setattr(chatbot, "search_products", lambda query: queries.append(query) or search_products(query))
+    replay(["有没有收益5%以上的产品"])
+    assert queries == ["有没有收益5%以上的产品"]
+
+
+def test_product_question_after_recommendation_uses_retrieval(fake_client):
+    replay([
+        "推荐一个理财产品", "我有10万元", "预期收益5%", "投资期限一年",
+        "换一个", "有没有抗通胀的稳健产品？"
+    ])
+    system_prompt = fake_client.requests[-1][0]["content"]
+    assert "与用户问题最相关的产品如下" in system_prompt
+    assert "交银理财稳享鑫荣日日开8号" in system_prompt
+
+
+def test_slot_answer_with_question_is_collected():
+    responses = replay(["推荐一个理财产品", "我有10万元，可以吗？"])
+    assert responses[1] == "您的预期收益率是？\n您的投资时间是？"
+
+
+def test_feedback_after_recommendation_re_recommends():
+    responses = replay([
+        "推荐一个理财产品", "我有10万元", "预期收益5%", "投资期限一年",
+        "期限能短一点吗？改成3个月"
+    ])
+    assert "推荐以下产品" in responses[3]
+    assert "推荐以下产品" in responses[4]